@@ -8,6 +8,7 @@ from pathlib import Path
 import pandas as pd
 from loguru import logger
 import sys
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
@@ -72,6 +73,45 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# ============================================================================
+# Cached Loaders
+# ============================================================================
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_excel_cached(file_bytes: bytes, file_name: str) -> pd.DataFrame:
+    """Parse uploaded Excel once per distinct file content"""
+    return FileHandler.load_excel(Path(file_name), file_bytes)
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> tuple:
+    """Cheap cache key: shape, columns and a hash of the rows the scan samples"""
+    head_hash = pd.util.hash_pandas_object(df.head(200), index=True).sum()
+    return (tuple(df.columns), df.shape, int(head_hash))
+
+
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs={pd.DataFrame: dataframe_fingerprint})
+def scan_dataframe_cached(df: pd.DataFrame) -> dict:
+    """Run the PII scan once per distinct DataFrame"""
+    return PIIDetector().scan_dataframe(df)
+
+# ============================================================================
+# Preview Helpers
+# ============================================================================
+
+# Wide sheets are previewed narrow to keep the payload sent to the browser small
+PREVIEW_MAX_COLUMNS = 20
+
+
+def show_preview(df: pd.DataFrame, n_rows: int = 10, key: Optional[str] = None) -> None:
+    """Render a narrow preview; the full-width rows only render on demand"""
+    hidden = len(df.columns) - PREVIEW_MAX_COLUMNS
+    
+    if hidden <= 0 or (key is not None and st.checkbox(f"Show all {len(df.columns)} columns", key=key)):
+        st.dataframe(df.head(n_rows), use_container_width=True)
+    else:
+        st.dataframe(df.iloc[:n_rows, :PREVIEW_MAX_COLUMNS], use_container_width=True)
+        st.caption(f"{hidden} more columns not shown")
+
 # ============================================================================
 # Session State Initialization
 # ============================================================================
@@ -82,8 +122,14 @@ if 'df' not in st.session_state:
     st.session_state.df = None
 if 'pii_results' not in st.session_state:
     st.session_state.pii_results = None
+if 'sample_values' not in st.session_state:
+    st.session_state.sample_values = {}
 if 'selected_columns' not in st.session_state:
     st.session_state.selected_columns = {}
+if 'upload_key' not in st.session_state:
+    st.session_state.upload_key = None
+if 'upload_bytes' not in st.session_state:
+    st.session_state.upload_bytes = None
 
 # ============================================================================
 # Header
@@ -143,22 +189,24 @@ if st.session_state.step == 1:
     
     if uploaded_file is not None:
         try:
-            # Save temporarily
-            temp_path = Path("temp") / uploaded_file.name
-            temp_path.parent.mkdir(exist_ok=True)
+            # Keep the upload in memory; only re-read it when a new upload is chosen
+            # (file_id changes on every upload, even for a same-name, same-size file)
+            upload_key = uploaded_file.file_id
+            if st.session_state.upload_key != upload_key:
+                st.session_state.upload_key = upload_key
+                st.session_state.upload_bytes = uploaded_file.getvalue()
             
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            file_bytes = st.session_state.upload_bytes
             
             # Validate
-            is_valid, error_msg = FileHandler.validate_file(temp_path)
+            is_valid, error_msg = FileHandler.validate_bytes(uploaded_file.name, file_bytes)
             
             if not is_valid:
                 st.error(f"❌ {error_msg}")
             else:
                 # Load file
                 with st.spinner("Loading file..."):
-                    df = FileHandler.load_excel(temp_path)
+                    df = load_excel_cached(file_bytes, uploaded_file.name)
                     st.session_state.df = df
                 
                 # Show file info
@@ -171,7 +219,7 @@ if st.session_state.step == 1:
                 
                 # Show preview
                 st.subheader("📊 Data Preview")
-                st.dataframe(df.head(10), use_container_width=True)
+                show_preview(df, key="preview_all_columns")
                 
                 # Next button
                 if st.button("🔍 Scan for PII →", type="primary", use_container_width=True):
@@ -191,12 +239,18 @@ elif st.session_state.step == 2:
             st.session_state.step = 1
             st.rerun()
     else:
-        # Perform PII detection
+        # Perform PII detection (cached across reruns for the same file)
         if st.session_state.pii_results is None:
             with st.spinner("Scanning for PII... This may take a moment."):
-                detector = PIIDetector()
-                pii_results = detector.scan_dataframe(st.session_state.df)
+                pii_results = scan_dataframe_cached(st.session_state.df)
                 st.session_state.pii_results = pii_results
+                
+                # Sample values for flagged columns, computed once per scan
+                detector = PIIDetector()
+                st.session_state.sample_values = {
+                    col: detector.get_sample_values(st.session_state.df[col], n=3)
+                    for col in pii_results
+                }
         
         pii_results = st.session_state.pii_results
         
@@ -233,7 +287,7 @@ elif st.session_state.step == 2:
                     )
                     
                     # Show samples
-                    samples = detector.get_sample_values(st.session_state.df[col], n=3)
+                    samples = st.session_state.sample_values.get(col, [])
                     st.markdown(f"**Sample values:** `{', '.join(samples)}`")
                     
                     # Store selection
@@ -260,6 +314,7 @@ elif st.session_state.step == 2:
             if st.button("← Back to Upload"):
                 st.session_state.step = 1
                 st.session_state.pii_results = None
+                st.session_state.sample_values = {}
                 st.rerun()
         
         with col2:
@@ -316,39 +371,34 @@ elif st.session_state.step == 3:
                     
                     # Show preview
                     st.subheader("📊 Anonymized Data Preview")
-                    st.dataframe(df_anon.head(10), use_container_width=True)
+                    show_preview(df_anon)
                     
-                    # Save anonymized file
-                    output_path = Path("temp") / "anonymized_output.xlsx"
-                    FileHandler.save_excel(df_anon, output_path)
+                    # Build anonymized file in memory (nothing written to disk)
+                    output_bytes = FileHandler.save_excel_to_bytes(df_anon)
                     
                     # Download button
-                    with open(output_path, "rb") as f:
-                        st.download_button(
-                            label="📥 Download Anonymized File",
-                            data=f,
-                            file_name="anonymized_data.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
+                    st.download_button(
+                        label="📥 Download Anonymized File",
+                        data=output_bytes,
+                        file_name="anonymized_data.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        use_container_width=True
+                    )
                     
                     # Save mapping if requested
                     if save_mapping and mapping_password:
-                        mapping_path = Path("temp") / "mapping.enc"
-                        CryptoHandler.encrypt_mapping(
+                        mapping_bytes = CryptoHandler.encrypt_mapping_to_bytes(
                             anonymizer.get_mappings(),
-                            mapping_password,
-                            mapping_path
+                            mapping_password
                         )
                         
-                        with open(mapping_path, "rb") as f:
-                            st.download_button(
-                                label="🔑 Download Encrypted Mapping",
-                                data=f,
-                                file_name="anonymization_mapping.enc",
-                                mime="application/octet-stream",
-                                use_container_width=True
-                            )
+                        st.download_button(
+                            label="🔑 Download Encrypted Mapping",
+                            data=mapping_bytes,
+                            file_name="anonymization_mapping.enc",
+                            mime="application/octet-stream",
+                            use_container_width=True
+                        )
                     
                     st.markdown("---")
                     st.markdown('<div class="success-box">✅ Your file is now safe to share with AI tools, consultants, or external parties!</div>', unsafe_allow_html=True)
@@ -358,7 +408,10 @@ elif st.session_state.step == 3:
                         st.session_state.step = 1
                         st.session_state.df = None
                         st.session_state.pii_results = None
+                        st.session_state.sample_values = {}
                         st.session_state.selected_columns = {}
+                        st.session_state.upload_key = None
+                        st.session_state.upload_bytes = None
                         st.rerun()
             
             except Exception as e:
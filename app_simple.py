@@ -8,7 +8,17 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 import re
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
+
+# xlsx export (sheet writer and xlsxwriter options) shared with the src package
+from src.file_handler import FileHandler
+
+# Prefer the Rust-based calamine reader when installed (much faster parsing)
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # let pandas pick openpyxl / xlrd
 
 # ============================================================================
 # Page Configuration
@@ -20,6 +30,43 @@ st.set_page_config(
     layout="wide",
 )
 
+# ============================================================================
+# PII Patterns (compiled once at import)
+# ============================================================================
+
+ID_PATTERN = re.compile(r'\b\d{9}\b')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'\b0\d{1,2}-?\d{7}\b')
+
+# All content patterns in one pass, one named group per type. Every pattern
+# is a lookahead so overlapping PII is reported independently (a 9-digit
+# number starting with 0 is both ID and phone) - same form as
+# src/pii_detector.py
+PII_TYPE_PATTERNS = {'ID': ID_PATTERN, 'EMAIL': EMAIL_PATTERN, 'PHONE': PHONE_PATTERN}
+COMBINED_PATTERN = re.compile(
+    "".join(f"(?=(?P<{name}>{pattern.pattern}))?" for name, pattern in PII_TYPE_PATTERNS.items())
+    + r"(?(ID)|(?(EMAIL)|(?(PHONE)|(?!))))"
+)
+
+# Column-name keywords per type, checked in order (substring match)
+NAME_KEYWORDS = (
+    ('ID', ('ת.ז', 'תז', 'id', 'מזהה', 'זהות')),
+    ('EMAIL', ('מייל', 'email', 'דוא"ל', 'אימייל')),
+    ('PHONE', ('טלפון', 'נייד', 'phone', 'פלאפון', 'פרטי קשר')),
+    ('PERSON', ('שם', 'name', 'מבוטח', 'לקוח')),
+    ('ADDRESS', ('כתובת', 'address', 'רחוב', 'עיר', 'משלוח')),
+    ('ACCOUNT', ('חשבון', 'account', 'בנק')),
+)
+
+# Non-null values scan_column inspects per column (half from the top, half from the bottom)
+SCAN_SAMPLE_SIZE = 50
+
+# Max non-null values auto_detect_type inspects per column
+CONTENT_SAMPLE_SIZE = 20
+
+# Wide sheets are previewed narrow to keep the payload sent to the browser small
+PREVIEW_MAX_COLUMNS = 20
+
 # ============================================================================
 # Helper Functions
 # ============================================================================
@@ -28,102 +75,157 @@ def detect_israeli_id(text):
     """Detect Israeli ID (9 digits)"""
     if not isinstance(text, str):
         text = str(text)
-    return bool(re.search(r'\b\d{9}\b', text))
+    return bool(ID_PATTERN.search(text))
 
 def detect_email(text):
     """Detect email addresses"""
     if not isinstance(text, str):
         text = str(text)
-    return bool(re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text))
+    return bool(EMAIL_PATTERN.search(text))
 
 def detect_phone(text):
     """Detect Israeli phone numbers"""
     if not isinstance(text, str):
         text = str(text)
-    return bool(re.search(r'\b0\d{1,2}-?\d{7}\b', text))
+    return bool(PHONE_PATTERN.search(text))
 
 def auto_detect_type(column_name, sample_values):
     """Auto-detect PII type based on column name and content"""
-    col_lower = column_name.lower()
+    col_lower = str(column_name).lower()
     
     # Check column name
-    if any(word in col_lower for word in ['ת.ז', 'תז', 'id', 'מזהה', 'זהות']):
-        return 'ID'
-    elif any(word in col_lower for word in ['מייל', 'email', 'דוא"ל', 'אימייל']):
-        return 'EMAIL'
-    elif any(word in col_lower for word in ['טלפון', 'נייד', 'phone', 'פלאפון', 'פרטי קשר']):
-        return 'PHONE'
-    elif any(word in col_lower for word in ['שם', 'name', 'מבוטח', 'לקוח']):
-        return 'PERSON'
-    elif any(word in col_lower for word in ['כתובת', 'address', 'רחוב', 'עיר', 'משלוח']):
-        return 'ADDRESS'
-    elif any(word in col_lower for word in ['חשבון', 'account', 'בנק']):
-        return 'ACCOUNT'
+    for pii_type, keywords in NAME_KEYWORDS:
+        if any(word in col_lower for word in keywords):
+            return pii_type
+    
+    # Check content - single pass with the combined pattern over a capped
+    # sample, stopping as soon as the highest-priority type (ID) is seen
+    values = [str(v) for v in sample_values if pd.notna(v)][:CONTENT_SAMPLE_SIZE]
+    found = set()
     
-    # Check content
-    has_id = any(detect_israeli_id(str(v)) for v in sample_values if pd.notna(v))
-    has_email = any(detect_email(str(v)) for v in sample_values if pd.notna(v))
-    has_phone = any(detect_phone(str(v)) for v in sample_values if pd.notna(v))
+    for text in values:
+        for match in COMBINED_PATTERN.finditer(text):
+            if match.group('ID') is not None:
+                return 'ID'
+            found.update(name for name, value in match.groupdict().items() if value is not None)
     
-    if has_id:
-        return 'ID'
-    elif has_email:
-        return 'EMAIL'
-    elif has_phone:
-        return 'PHONE'
+    for pii_type in ['EMAIL', 'PHONE']:
+        if pii_type in found:
+            return pii_type
     
     return 'OTHER'
 
 def scan_column(series):
     """Scan a column for PII"""
-    results = {'israeli_id': 0, 'email': 0, 'phone': 0}
-    sample = series.head(min(50, len(series)))
+    # Sample non-null values from both ends of the column, so a blank or
+    # atypical top section doesn't hide PII further down
+    values = series.dropna()
+    if len(values) > SCAN_SAMPLE_SIZE:
+        half = SCAN_SAMPLE_SIZE // 2
+        values = pd.concat([values.head(half), values.tail(half)])
     
-    for value in sample:
-        if pd.isna(value):
-            continue
-        text = str(value)
-        if detect_israeli_id(text):
-            results['israeli_id'] += 1
-        if detect_email(text):
-            results['email'] += 1
-        if detect_phone(text):
-            results['phone'] += 1
+    # Vectorized: a single extractall pass with the combined pattern
+    sample = values.astype('string').reset_index(drop=True)
+    matches = sample.str.extractall(COMBINED_PATTERN)
     
-    return results
+    # A row counts once per type, however many matches it holds
+    hits = matches.notna().groupby(level=0).any().sum()
+    
+    return {
+        'israeli_id': int(hits.get('ID', 0)),
+        'email': int(hits.get('EMAIL', 0)),
+        'phone': int(hits.get('PHONE', 0)),
+    }
 
 def anonymize_column(series, prefix='ANON'):
     """Anonymize a column with consistent mapping"""
-    mapping = {}
-    counter = 0
+    # Integer codes in order of first appearance (computed in C); missing -> -1
+    codes, uniques = pd.factorize(series, sort=False)
+    labels = [f"{prefix}-{i:03d}" for i in range(1, len(uniques) + 1)]
+    
+    # Categorical result: one small int code per row instead of a string object
+    result = pd.Series(
+        pd.Categorical.from_codes(codes, categories=labels),
+        index=series.index,
+        name=series.name
+    )
+    
+    mapping = dict(zip(uniques.tolist(), labels))
+    return result, mapping
+
+def show_preview(df, n_rows=10, key=None):
+    """Render a narrow preview; the full-width rows only render on demand"""
+    hidden = len(df.columns) - PREVIEW_MAX_COLUMNS
+    
+    if hidden <= 0 or (key is not None and st.checkbox(f"Show all {len(df.columns)} columns", key=key)):
+        st.dataframe(df.head(n_rows), use_container_width=True)
+    else:
+        st.dataframe(df.iloc[:n_rows, :PREVIEW_MAX_COLUMNS], use_container_width=True)
+        st.caption(f"{hidden} more columns not shown")
+
+def profile_sheet(df):
+    """Per-column PII scan counts and suggested type for one sheet"""
+    profile = {}
+    
+    for col in df.columns:
+        series = df[col]
+        profile[col] = {
+            'pii_counts': scan_column(series),
+            'suggested_type': auto_detect_type(col, series.dropna().head(10).tolist()),
+        }
+    
+    return profile
+
+def anonymize_sheet(df, selected):
+    """Anonymize the selected columns of one sheet"""
+    # Shallow copy: untouched columns share data with the uploaded sheet,
+    # anonymized columns are assigned as new arrays
+    df = df.copy(deep=False)
+    sheet_mappings = {}
+    
+    for col, prefix in selected.items():
+        df[col], mapping = anonymize_column(df[col], prefix)
+        sheet_mappings[col] = mapping
+    
+    return df, sheet_mappings
+
+def iter_anonymized_sheets(sheets_data, sheet_names, selected_columns):
+    """Yield (sheet_name, anonymized_df, mappings) one sheet at a time"""
+    # Sequential on purpose: factorize and label building on object/str data
+    # hold the GIL, so a thread pool is slower and keeps several sheets alive
+    for sheet_name in sheet_names:
+        df, sheet_mappings = anonymize_sheet(
+            sheets_data[sheet_name],
+            selected_columns.get(sheet_name, {})
+        )
+        yield sheet_name, df, sheet_mappings
+
+@st.cache_data(show_spinner="Loading file...", max_entries=4)
+def parse_excel_bytes(file_bytes):
+    """Parse all sheets from raw Excel bytes and profile their columns (cached per file content)"""
+    # Open the workbook once and load every sheet from the same handle
+    with pd.ExcelFile(BytesIO(file_bytes), engine=EXCEL_ENGINE) as excel_file:
+        sheets = pd.read_excel(excel_file, sheet_name=None)
     
-    def get_anon_value(val):
-        nonlocal counter
-        if pd.isna(val):
-            return val
-        if val not in mapping:
-            counter += 1
-            mapping[val] = f"{prefix}-{counter:03d}"
-        return mapping[val]
+    # Scan each column while the freshly loaded data is at hand
+    profiles = {name: profile_sheet(df) for name, df in sheets.items()}
     
-    return series.apply(get_anon_value), mapping
+    return sheets, profiles
+
+@st.cache_data(show_spinner="Loading file...", max_entries=4)
+def parse_csv_bytes(file_bytes):
+    """Parse raw CSV bytes and profile its columns (cached per file content)"""
+    df = pd.read_csv(BytesIO(file_bytes))
+    return df, profile_sheet(df)
 
 def load_excel_sheets(file):
-    """Load all sheets from Excel file"""
+    """Load all sheets from Excel file, with per-column PII profiles"""
     try:
-        # Read all sheet names
-        excel_file = pd.ExcelFile(file)
-        sheet_names = excel_file.sheet_names
-        
-        # Load all sheets
-        sheets = {}
-        for sheet_name in sheet_names:
-            sheets[sheet_name] = pd.read_excel(file, sheet_name=sheet_name)
-        
-        return sheets
+        # Reruns with the same upload hit the cache instead of re-parsing
+        return parse_excel_bytes(file.getvalue())
     except Exception as e:
         st.error(f"Error loading Excel file: {str(e)}")
-        return None
+        return None, None
 
 # ============================================================================
 # Session State
@@ -139,6 +241,12 @@ if 'selected_columns' not in st.session_state:
     st.session_state.selected_columns = {}  # {sheet_name: {col: type}}
 if 'file_name' not in st.session_state:
     st.session_state.file_name = None
+if 'column_profiles' not in st.session_state:
+    st.session_state.column_profiles = {}  # {sheet_name: {col: profile}}
+if 'previews' not in st.session_state:
+    st.session_state.previews = {}  # {sheet_name: first rows}
+if 'upload_key' not in st.session_state:
+    st.session_state.upload_key = None  # file_id of the loaded upload
 
 # ============================================================================
 # Header
@@ -203,23 +311,43 @@ if st.session_state.step == 1:
     if uploaded_file:
         st.session_state.file_name = uploaded_file.name
         
+        # Parse only when a different upload is chosen; later reruns reuse
+        # the sheets, profiles and previews already in session state.
+        # file_id is new for every upload, even a same-name, same-size file
+        upload_key = uploaded_file.file_id
+        is_new_upload = st.session_state.upload_key != upload_key
+        
         try:
             # Check if CSV or Excel
             if uploaded_file.name.endswith('.csv'):
                 # CSV - single sheet
-                df = pd.read_csv(uploaded_file)
-                st.session_state.sheets_data = {'Sheet1': df}
+                if is_new_upload:
+                    df, profile = parse_csv_bytes(uploaded_file.getvalue())
+                    st.session_state.sheets_data = {'Sheet1': df}
+                    st.session_state.column_profiles = {'Sheet1': profile}
+                    st.session_state.previews = {'Sheet1': df.head(5)}
+                    st.session_state.upload_key = upload_key
+                
                 st.session_state.selected_sheets = ['Sheet1']
                 
                 st.success("✅ CSV file loaded successfully")
                 
             else:
                 # Excel - may have multiple sheets
-                sheets = load_excel_sheets(uploaded_file)
+                if is_new_upload:
+                    sheets, profiles = load_excel_sheets(uploaded_file)
+                    
+                    if sheets:
+                        st.session_state.sheets_data = sheets
+                        st.session_state.column_profiles = profiles
+                        st.session_state.previews = {
+                            name: df.head(5) for name, df in sheets.items()
+                        }
+                        st.session_state.upload_key = upload_key
+                
+                sheets = st.session_state.sheets_data if st.session_state.upload_key == upload_key else None
                 
                 if sheets:
-                    st.session_state.sheets_data = sheets
-                    
                     st.success(f"✅ Excel file loaded with **{len(sheets)}** sheet(s)")
                     
                     # Show sheet selector
@@ -255,7 +383,11 @@ if st.session_state.step == 1:
                             
                             # Show preview
                             with st.expander(f"Preview: {sheet_name}"):
-                                st.dataframe(df.head(5), use_container_width=True)
+                                show_preview(
+                                    st.session_state.previews[sheet_name],
+                                    5,
+                                    key=f"preview_all_{sheet_name}"
+                                )
                         
                         st.session_state.selected_sheets = selected_sheets
             
@@ -318,12 +450,18 @@ elif st.session_state.step == 2:
             st.subheader(f"📄 Sheet: {sheet_name}")
             st.write(f"*{len(df)} rows × {len(df.columns)} columns*")
             
-            # Scan for PII
-            pii_detected = {}
-            for col in df.columns:
-                results = scan_column(df[col])
-                if any(v > 0 for v in results.values()):
-                    pii_detected[col] = results
+            # PII scan results were computed when the file was loaded;
+            # profile any sheet that lacks one once and keep it for later reruns
+            profile = st.session_state.column_profiles.get(sheet_name)
+            if profile is None:
+                profile = profile_sheet(df)
+                st.session_state.column_profiles[sheet_name] = profile
+            
+            pii_detected = {
+                col: info['pii_counts']
+                for col, info in profile.items()
+                if any(v > 0 for v in info['pii_counts'].values())
+            }
             
             if pii_detected:
                 st.success(f"✅ Found potential PII in {len(pii_detected)} columns")
@@ -337,9 +475,8 @@ elif st.session_state.step == 2:
             # Column selection
             with st.expander(f"📋 Select Columns in '{sheet_name}'", expanded=True):
                 for col in df.columns:
-                    # Auto-detect type
-                    sample_values = df[col].dropna().head(10).tolist()
-                    suggested_type = auto_detect_type(col, sample_values)
+                    # Auto-detected type
+                    suggested_type = profile[col]['suggested_type']
                     
                     is_detected = col in pii_detected
                     
@@ -420,83 +557,87 @@ elif st.session_state.step == 3:
         if st.button("🚀 Start Anonymization", type="primary", use_container_width=True):
             try:
                 with st.spinner("🔄 Anonymizing data..."):
-                    # Anonymize each sheet
-                    anonymized_sheets = {}
-                    all_mappings = {}
+                    # Anonymize one sheet at a time and write it straight into the
+                    # workbook, so only one anonymized sheet is held in memory at a time
+                    output = BytesIO()
+                    previews = {}
                     stats = {'total_values': 0, 'unique_values': 0}
+                    excel_error = None
                     
-                    for sheet_name in st.session_state.selected_sheets:
-                        df = st.session_state.sheets_data[sheet_name].copy()
-                        selected = st.session_state.selected_columns.get(sheet_name, {})
-                        
-                        if selected:
-                            sheet_mappings = {}
-                            for col, prefix in selected.items():
-                                df[col], mapping = anonymize_column(df[col], prefix)
-                                sheet_mappings[col] = mapping
-                                stats['total_values'] += len(df[col])
-                                stats['unique_values'] += len(mapping)
-                            
-                            all_mappings[sheet_name] = sheet_mappings
+                    try:
+                        with pd.ExcelWriter(
+                            output,
+                            engine='xlsxwriter',
+                            engine_kwargs={'options': FileHandler.WRITER_OPTIONS}
+                        ) as writer:
+                            for sheet_name, df, sheet_mappings in iter_anonymized_sheets(
+                                st.session_state.sheets_data,
+                                st.session_state.selected_sheets,
+                                st.session_state.selected_columns
+                            ):
+                                FileHandler.write_sheet(writer.book, sheet_name, df)
+                                previews[sheet_name] = df.head(10)
+                                for mapping in sheet_mappings.values():
+                                    stats['total_values'] += len(df)
+                                    stats['unique_values'] += len(mapping)
+                    except Exception as e:
+                        excel_error = e
+                    
+                    if excel_error is not None:
+                        # Fallback: save as separate CSV files (zipped)
+                        import zipfile
+                        output = BytesIO()
+                        previews = {}
+                        stats = {'total_values': 0, 'unique_values': 0}
                         
-                        anonymized_sheets[sheet_name] = df
+                        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                            for sheet_name, df, sheet_mappings in iter_anonymized_sheets(
+                                st.session_state.sheets_data,
+                                st.session_state.selected_sheets,
+                                st.session_state.selected_columns
+                            ):
+                                # Stream rows straight into the zip entry (no full CSV copy)
+                                with zip_file.open(f"{sheet_name}.csv", 'w') as entry:
+                                    with TextIOWrapper(entry, encoding='utf-8', newline='') as csv_stream:
+                                        df.to_csv(csv_stream, index=False, chunksize=50000)
+                                previews[sheet_name] = df.head(10)
+                                for mapping in sheet_mappings.values():
+                                    stats['total_values'] += len(df)
+                                    stats['unique_values'] += len(mapping)
+                    
+                    output.seek(0)
                 
                 st.success("✅ Anonymization Complete!")
                 
                 # Show statistics
                 col1, col2, col3 = st.columns(3)
-                col1.metric("Sheets Processed", len(anonymized_sheets))
+                col1.metric("Sheets Processed", len(previews))
                 col2.metric("Columns Anonymized", total_columns)
                 col3.metric("Unique Values Mapped", stats['unique_values'])
                 
                 # Show preview for each sheet
                 st.subheader("📊 Anonymized Data Preview")
-                for sheet_name, df in anonymized_sheets.items():
+                for sheet_name, preview in previews.items():
                     with st.expander(f"Preview: {sheet_name}"):
-                        st.dataframe(df.head(10), use_container_width=True)
+                        show_preview(preview)
                 
-                # Save to Excel with multiple sheets
-                output = BytesIO()
-                
-                try:
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        for sheet_name, df in anonymized_sheets.items():
-                            df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    output.seek(0)
-                    
-                    file_ext = "xlsx"
-                    mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    
+                st.markdown("---")
+                if excel_error is None:
                     # Download button
-                    st.markdown("---")
                     st.download_button(
-                        label=f"📥 Download Anonymized File ({len(anonymized_sheets)} sheets)",
+                        label=f"📥 Download Anonymized File ({len(previews)} sheets)",
                         data=output,
                         file_name=f"anonymized_{st.session_state.file_name}",
-                        mime=mime,
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         use_container_width=True
                     )
-                    
-                except Exception as e:
-                    st.error(f"Error creating Excel file: {str(e)}")
-                    st.info("Trying CSV export as fallback...")
-                    
-                    # Fallback: save as separate CSV files (zipped)
-                    import zipfile
-                    zip_buffer = BytesIO()
-                    
-                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                        for sheet_name, df in anonymized_sheets.items():
-                            csv_buffer = BytesIO()
-                            df.to_csv(csv_buffer, index=False)
-                            zip_file.writestr(f"{sheet_name}.csv", csv_buffer.getvalue())
-                    
-                    zip_buffer.seek(0)
+                else:
+                    st.error(f"Error creating Excel file: {str(excel_error)}")
+                    st.info("Exported as CSV files instead.")
                     
                     st.download_button(
-                        label=f"📥 Download Anonymized Files (ZIP with {len(anonymized_sheets)} CSVs)",
-                        data=zip_buffer,
+                        label=f"📥 Download Anonymized Files (ZIP with {len(previews)} CSVs)",
+                        data=output,
                         file_name=f"anonymized_{st.session_state.file_name.replace('.xlsx', '.zip')}",
                         mime="application/zip",
                         use_container_width=True
@@ -511,6 +652,9 @@ elif st.session_state.step == 3:
                     st.session_state.selected_sheets = []
                     st.session_state.selected_columns = {}
                     st.session_state.file_name = None
+                    st.session_state.column_profiles = {}
+                    st.session_state.previews = {}
+                    st.session_state.upload_key = None
                     st.rerun()
                     
             except Exception as e:
@@ -3,8 +3,9 @@ Anonymizer Module
 Handles consistent anonymization of PII data
 """
 
-import hashlib
-from typing import Dict, Any
+from hashlib import blake2b
+from typing import Dict, Any, List
+import numpy as np
 import pandas as pd
 from loguru import logger
 
@@ -12,11 +13,29 @@ from loguru import logger
 class Anonymizer:
     """Consistent anonymization of PII values"""
     
+    # Map PII type to ID prefix
+    PREFIX_MAP = {
+        'israeli_id': 'ID',
+        'email': 'EMAIL',
+        'phone': 'PHONE',
+        'name': 'PERSON',
+        'address': 'ADDRESS',
+        'account': 'ACCOUNT'
+    }
+    
     def __init__(self):
         """Initialize anonymizer with empty mappings"""
-        self.mappings: Dict[str, Dict[Any, str]] = {}
+        # Columnar layout per PII type: original value -> position,
+        # and position -> anonymous ID (insertion order is preserved)
+        self._index: Dict[str, Dict[Any, int]] = {}
+        self._anon_ids: Dict[str, List[str]] = {}
         self.counters: Dict[str, int] = {}
     
+    @property
+    def mappings(self) -> Dict[str, Dict[Any, str]]:
+        """Mappings as {pii_type: {original: anonymous}} (built on access)"""
+        return self.get_mappings()
+    
     def _get_next_id(self, prefix: str) -> str:
         """
         Get next sequential anonymous ID
@@ -33,6 +52,23 @@ class Anonymizer:
         self.counters[prefix] += 1
         return f"{prefix}-{self.counters[prefix]:03d}"
     
+    def _get_next_ids(self, prefix: str, count: int) -> np.ndarray:
+        """
+        Get the next `count` sequential anonymous IDs in one vectorized step
+        
+        Args:
+            prefix: Prefix for the IDs (e.g., 'ID', 'EMAIL')
+            count: Number of IDs to generate
+            
+        Returns:
+            Array of ID strings, same format as _get_next_id
+        """
+        start = self.counters.get(prefix, 0)
+        self.counters[prefix] = start + count
+        
+        numbers = np.arange(start + 1, start + count + 1).astype(str)
+        return np.char.add(f"{prefix}-", np.char.zfill(numbers, 3))
+    
     def _get_deterministic_id(self, value: Any, prefix: str) -> str:
         """
         Generate deterministic ID using hash (consistent across runs)
@@ -44,12 +80,38 @@ class Anonymizer:
         Returns:
             Anonymous ID string
         """
-        # Create hash of the value
-        hash_obj = hashlib.sha256(str(value).encode('utf-8'))
-        hash_hex = hash_obj.hexdigest()[:8]  # First 8 chars
+        text = value if isinstance(value, str) else str(value)
+        
+        # Short non-cryptographic tag: a 4-byte BLAKE2b digest is exactly 8 hex chars
+        hash_hex = blake2b(text.encode('utf-8'), digest_size=4).hexdigest()
         
         return f"{prefix}-{hash_hex}"
     
+    def _get_deterministic_ids(self, values: List[Any], prefix: str,
+                               numeric: bool = False) -> List[str]:
+        """
+        Generate deterministic IDs for many values (same IDs as _get_deterministic_id)
+        
+        Args:
+            values: Original values
+            prefix: Prefix for the IDs
+            numeric: Values are all int/float/bool, so they can be
+                converted to text in one numpy call
+            
+        Returns:
+            List of anonymous ID strings
+        """
+        if numeric:
+            # numpy's str() of int64/float64/bool matches Python's str()
+            texts = np.asarray(values).astype(str).tolist()
+        else:
+            texts = [v if isinstance(v, str) else str(v) for v in values]
+        
+        return [
+            f"{prefix}-{blake2b(text.encode('utf-8'), digest_size=4).hexdigest()}"
+            for text in texts
+        ]
+    
     def anonymize_value(self, value: Any, pii_type: str, 
                        deterministic: bool = False) -> str:
         """
@@ -67,25 +129,16 @@ class Anonymizer:
         if pd.isna(value):
             return value
         
-        # Map PII type to prefix
-        prefix_map = {
-            'israeli_id': 'ID',
-            'email': 'EMAIL',
-            'phone': 'PHONE',
-            'name': 'PERSON',
-            'address': 'ADDRESS',
-            'account': 'ACCOUNT'
-        }
-        
-        prefix = prefix_map.get(pii_type, 'ANON')
+        prefix = self.PREFIX_MAP.get(pii_type, 'ANON')
         
         # Initialize mapping for this type if needed
-        if pii_type not in self.mappings:
-            self.mappings[pii_type] = {}
+        index = self._index.setdefault(pii_type, {})
+        anon_ids = self._anon_ids.setdefault(pii_type, [])
         
         # Check if we've seen this value before
-        if value in self.mappings[pii_type]:
-            return self.mappings[pii_type][value]
+        position = index.get(value)
+        if position is not None:
+            return anon_ids[position]
         
         # Generate new anonymous ID
         if deterministic:
@@ -94,7 +147,8 @@ class Anonymizer:
             anon_value = self._get_next_id(prefix)
         
         # Store mapping
-        self.mappings[pii_type][value] = anon_value
+        index[value] = len(anon_ids)
+        anon_ids.append(anon_value)
         
         return anon_value
     
@@ -113,11 +167,38 @@ class Anonymizer:
         """
         logger.info(f"Anonymizing column with {len(series)} values as {pii_type}...")
         
-        result = series.apply(
-            lambda x: self.anonymize_value(x, pii_type, deterministic)
-        )
+        # Unique values in order of first appearance (missing -> code -1)
+        codes, uniques = pd.factorize(series, sort=False)
+        uniques = pd.Index(uniques)
         
-        unique_mappings = len(self.mappings.get(pii_type, {}))
+        # Values already mapped (e.g. by an earlier column) resolve in one
+        # vectorized lookup; only unseen values get new IDs
+        known = uniques.map(self._index.get(pii_type, {}))
+        new_values = list(dict.fromkeys(uniques[pd.isna(known)].tolist()))
+        
+        if new_values:
+            prefix = self.PREFIX_MAP.get(pii_type, 'ANON')
+            index = self._index.setdefault(pii_type, {})
+            anon_ids = self._anon_ids.setdefault(pii_type, [])
+            
+            if deterministic:
+                numeric = uniques.dtype.kind in 'iufb'
+                new_ids = self._get_deterministic_ids(new_values, prefix, numeric)
+            else:
+                new_ids = self._get_next_ids(prefix, len(new_values)).tolist()
+            
+            start = len(anon_ids)
+            index.update(zip(new_values, range(start, start + len(new_values))))
+            anon_ids.extend(new_ids)
+        
+        positions = np.asarray(uniques.map(self._index.get(pii_type, {})), dtype=np.intp)
+        anon_uniques = np.asarray(self._anon_ids.get(pii_type, []), dtype=object)[positions]
+        
+        result = series.astype(object)
+        present = codes != -1
+        result[present] = anon_uniques[codes[present]]
+        
+        unique_mappings = len(self._anon_ids.get(pii_type, []))
         logger.success(f"Anonymized column: {unique_mappings} unique values mapped")
         
         return result
@@ -138,8 +219,9 @@ class Anonymizer:
         """
         logger.info(f"Starting anonymization of {len(column_types)} columns...")
         
-        # Create a copy to avoid modifying original
-        df_anon = df.copy()
+        # Shallow copy: only the anonymized columns get new data, the
+        # rest share memory with the original without modifying it
+        df_anon = df.copy(deep=False)
         
         for col, pii_type in column_types.items():
             if col in df_anon.columns:
@@ -159,7 +241,10 @@ class Anonymizer:
         Returns:
             Dictionary of all mappings by PII type
         """
-        return self.mappings
+        return {
+            pii_type: dict(zip(index, self._anon_ids[pii_type]))
+            for pii_type, index in self._index.items()
+        }
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -169,15 +254,15 @@ class Anonymizer:
             Dictionary with statistics
         """
         stats = {
-            'total_pii_types': len(self.mappings),
-            'total_values_mapped': sum(len(m) for m in self.mappings.values()),
+            'total_pii_types': len(self._anon_ids),
+            'total_values_mapped': sum(len(ids) for ids in self._anon_ids.values()),
             'by_type': {}
         }
         
-        for pii_type, mapping in self.mappings.items():
+        for pii_type, anon_ids in self._anon_ids.items():
             stats['by_type'][pii_type] = {
-                'unique_values': len(mapping),
-                'examples': list(mapping.values())[:3]  # First 3 examples
+                'unique_values': len(anon_ids),
+                'examples': anon_ids[:3]  # First 3 examples
             }
         
         return stats
@@ -4,18 +4,47 @@ Handles encryption and decryption of mapping files
 """
 
 import json
+import os
 from pathlib import Path
 from typing import Dict, Any
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 from loguru import logger
 
+# orjson serializes straight to UTF-8 bytes in Rust; fall back to stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dump_json(mapping: Dict[str, Any], indent: bool = False) -> bytes:
+    """Serialize mapping to UTF-8 JSON bytes (non-string keys become strings)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(mapping, option=option)
+    
+    return json.dumps(mapping, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def _load_json(data: bytes) -> Dict[str, Any]:
+    """Parse UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    
+    return json.loads(data.decode('utf-8'))
+
 
 class CryptoHandler:
     """Handles encryption/decryption of sensitive mapping files"""
     
+    # PBKDF2-SHA256 work factor (OWASP recommendation); used for both encrypt and decrypt
+    KDF_ITERATIONS = 600_000
+    
     @staticmethod
     def _derive_key(password: str, salt: bytes) -> bytes:
         """
@@ -28,25 +57,26 @@ class CryptoHandler:
         Returns:
             Derived key
         """
-        kdf = PBKDF2(
+        kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=100000,
+            iterations=CryptoHandler.KDF_ITERATIONS,
         )
         key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
         return key
     
     @staticmethod
-    def encrypt_mapping(mapping: Dict[str, Any], password: str,
-                       output_path: Path) -> None:
+    def encrypt_mapping_to_bytes(mapping: Dict[str, Any], password: str) -> bytes:
         """
-        Encrypt mapping dictionary to file
+        Encrypt mapping dictionary in memory
         
         Args:
             mapping: Dictionary to encrypt
             password: Encryption password
-            output_path: Path to save encrypted file
+            
+        Returns:
+            Salt + encrypted data, ready to write or download
             
         Raises:
             ValueError: If encryption fails
@@ -55,23 +85,45 @@ class CryptoHandler:
             logger.info("Encrypting mapping file...")
             
             # Generate random salt
-            import os
             salt = os.urandom(16)
             
             # Derive key from password
             key = CryptoHandler._derive_key(password, salt)
             fernet = Fernet(key)
             
-            # Convert mapping to JSON
-            json_data = json.dumps(mapping, ensure_ascii=False, indent=2)
+            # Convert mapping to compact JSON bytes (encrypted, so no indentation)
+            json_data = _dump_json(mapping)
             
             # Encrypt
-            encrypted_data = fernet.encrypt(json_data.encode('utf-8'))
+            encrypted_data = fernet.encrypt(json_data)
             
+            return salt + encrypted_data
+            
+        except Exception as e:
+            logger.error(f"Encryption failed: {e}")
+            raise ValueError(f"לא ניתן להצפין את קובץ המיפוי: {str(e)}")
+    
+    @staticmethod
+    def encrypt_mapping(mapping: Dict[str, Any], password: str,
+                       output_path: Path) -> None:
+        """
+        Encrypt mapping dictionary to file
+        
+        Args:
+            mapping: Dictionary to encrypt
+            password: Encryption password
+            output_path: Path to save encrypted file
+            
+        Raises:
+            ValueError: If encryption fails
+        """
+        data = CryptoHandler.encrypt_mapping_to_bytes(mapping, password)
+        
+        try:
             # Save salt + encrypted data
             output_path.parent.mkdir(parents=True, exist_ok=True)
             with open(output_path, 'wb') as f:
-                f.write(salt + encrypted_data)
+                f.write(data)
             
             logger.success(f"Mapping encrypted and saved to: {output_path}")
             
@@ -80,16 +132,19 @@ class CryptoHandler:
             raise ValueError(f"לא ניתן להצפין את קובץ המיפוי: {str(e)}")
     
     @staticmethod
-    def decrypt_mapping(encrypted_path: Path, password: str) -> Dict[str, Any]:
+    def decrypt_mapping_raw(encrypted_path: Path, password: str) -> bytes:
         """
-        Decrypt mapping file
+        Decrypt mapping file without parsing it
+        
+        Useful for verifying a password or re-encrypting with a new one,
+        where the mapping never needs to be built as a dictionary.
         
         Args:
             encrypted_path: Path to encrypted file
             password: Decryption password
             
         Returns:
-            Decrypted mapping dictionary
+            Decrypted JSON bytes
             
         Raises:
             ValueError: If decryption fails
@@ -112,11 +167,32 @@ class CryptoHandler:
             # Decrypt
             decrypted_data = fernet.decrypt(encrypted_data)
             
-            # Parse JSON
-            mapping = json.loads(decrypted_data.decode('utf-8'))
-            
             logger.success("Mapping decrypted successfully")
-            return mapping
+            return decrypted_data
+            
+        except Exception as e:
+            logger.error(f"Decryption failed: {e}")
+            raise ValueError(f"לא ניתן לפענח את קובץ המיפוי: {str(e)}")
+    
+    @staticmethod
+    def decrypt_mapping(encrypted_path: Path, password: str) -> Dict[str, Any]:
+        """
+        Decrypt mapping file
+        
+        Args:
+            encrypted_path: Path to encrypted file
+            password: Decryption password
+            
+        Returns:
+            Decrypted mapping dictionary
+            
+        Raises:
+            ValueError: If decryption fails
+        """
+        decrypted_data = CryptoHandler.decrypt_mapping_raw(encrypted_path, password)
+        
+        try:
+            return _load_json(decrypted_data)
             
         except Exception as e:
             logger.error(f"Decryption failed: {e}")
@@ -135,8 +211,8 @@ class CryptoHandler:
         logger.warning("Saving UNENCRYPTED mapping file - use only for testing!")
         
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(mapping, f, ensure_ascii=False, indent=2)
+        with open(output_path, 'wb') as f:
+            f.write(_dump_json(mapping, indent=True))
         
         logger.info(f"Mapping saved to: {output_path}")
 
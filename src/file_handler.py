@@ -3,18 +3,45 @@ File Handler Module
 Handles reading and writing Excel files
 """
 
+import os
+import numpy as np
 import pandas as pd
+from io import BytesIO
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Iterator, List, Optional, Tuple
 import openpyxl
 from loguru import logger
 
+# Prefer the Rust-based calamine reader when installed (much faster parsing)
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
 
 class FileHandler:
     """Handles Excel file operations"""
     
     MAX_FILE_SIZE_MB = 10  # MVP limit
     
+    # Accepted Excel extensions (built once; set lookup)
+    VALID_EXTENSIONS = frozenset({'.xlsx', '.xls'})
+    
+    # xlsxwriter options: assemble the xlsx in memory (no temp files with cell
+    # data on disk - constant_memory would spill every cell to a plain-text
+    # temp file, and uploads are capped at MAX_FILE_SIZE_MB anyway), keep cell
+    # text as plain strings (no hyperlink conversion), and show dates the way
+    # pandas' to_excel does
+    WRITER_OPTIONS = {
+        'in_memory': True,
+        'strings_to_urls': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    }
+    
+    # secure_delete overwrites in chunks of this size (bounded memory)
+    WIPE_CHUNK_SIZE = 1024 * 1024
+    
     @staticmethod
     def validate_file(file_path: Path) -> Tuple[bool, Optional[str]]:
         """
@@ -26,29 +53,59 @@ class FileHandler:
         Returns:
             Tuple of (is_valid, error_message)
         """
-        # Check if file exists
-        if not file_path.exists():
+        # Check if file exists (one stat call also gives the size; OSError also
+        # covers paths that can't exist, e.g. under a regular file)
+        try:
+            file_stat = file_path.stat()
+        except OSError:
             return False, "קובץ לא נמצא / File not found"
         
         # Check file extension
-        valid_extensions = ['.xlsx', '.xls']
-        if file_path.suffix.lower() not in valid_extensions:
-            return False, f"פורמט לא נתמך. השתמש ב: {', '.join(valid_extensions)}"
+        if file_path.suffix.lower() not in FileHandler.VALID_EXTENSIONS:
+            return False, f"פורמט לא נתמך. השתמש ב: {', '.join(sorted(FileHandler.VALID_EXTENSIONS))}"
         
         # Check file size
-        file_size_mb = file_path.stat().st_size / (1024 * 1024)
-        if file_size_mb > FileHandler.MAX_FILE_SIZE_MB:
+        if file_stat.st_size > FileHandler.MAX_FILE_SIZE_MB * 1024 * 1024:
+            file_size_mb = file_stat.st_size / (1024 * 1024)
             return False, f"הקובץ גדול מדי ({file_size_mb:.1f}MB). מקסימום: {FileHandler.MAX_FILE_SIZE_MB}MB"
         
         return True, None
     
     @staticmethod
-    def load_excel(file_path: Path) -> pd.DataFrame:
+    def validate_bytes(file_name: str, file_bytes: bytes) -> Tuple[bool, Optional[str]]:
+        """
+        Validate uploaded file content held in memory
+        
+        Args:
+            file_name: Original file name (used for the extension check)
+            file_bytes: Raw file content
+            
+        Returns:
+            Tuple of (is_valid, error_message)
+        """
+        # Check file extension
+        if Path(file_name).suffix.lower() not in FileHandler.VALID_EXTENSIONS:
+            return False, f"פורמט לא נתמך. השתמש ב: {', '.join(sorted(FileHandler.VALID_EXTENSIONS))}"
+        
+        # Check file size
+        if len(file_bytes) > FileHandler.MAX_FILE_SIZE_MB * 1024 * 1024:
+            file_size_mb = len(file_bytes) / (1024 * 1024)
+            return False, f"הקובץ גדול מדי ({file_size_mb:.1f}MB). מקסימום: {FileHandler.MAX_FILE_SIZE_MB}MB"
+        
+        return True, None
+    
+    @staticmethod
+    def load_excel(file_path: Path, file_bytes: Optional[bytes] = None,
+                   nrows: Optional[int] = None,
+                   usecols: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Load Excel file into pandas DataFrame
         
         Args:
-            file_path: Path to Excel file
+            file_path: Path to Excel file (suffix selects the engine)
+            file_bytes: Raw file content; if given, parsed instead of reading from disk
+            nrows: Read only this many data rows (the engine stops parsing there)
+            usecols: Read only these columns
             
         Returns:
             pandas DataFrame
@@ -59,12 +116,18 @@ class FileHandler:
         try:
             logger.info(f"Loading Excel file: {file_path}")
             
-            # Try to read with openpyxl (for .xlsx)
-            if file_path.suffix.lower() == '.xlsx':
-                df = pd.read_excel(file_path, engine='openpyxl')
+            source = BytesIO(file_bytes) if file_bytes is not None else file_path
+            read_kwargs = {'nrows': nrows, 'usecols': usecols}
+            
+            if CALAMINE_AVAILABLE:
+                # calamine reads both .xlsx and .xls
+                df = pd.read_excel(source, engine='calamine', **read_kwargs)
+            elif file_path.suffix.lower() == '.xlsx':
+                # Fall back to openpyxl (for .xlsx)
+                df = pd.read_excel(source, engine='openpyxl', **read_kwargs)
             else:
                 # Use xlrd for .xls
-                df = pd.read_excel(file_path, engine='xlrd')
+                df = pd.read_excel(source, engine='xlrd', **read_kwargs)
             
             logger.success(f"Successfully loaded {len(df)} rows, {len(df.columns)} columns")
             return df
@@ -73,6 +136,79 @@ class FileHandler:
             logger.error(f"Failed to load Excel file: {e}")
             raise ValueError(f"לא ניתן לקרוא את הקובץ: {str(e)}")
     
+    @staticmethod
+    def load_excel_preview(file_path: Path, file_bytes: Optional[bytes] = None,
+                           nrows: int = 200) -> pd.DataFrame:
+        """
+        Load only the first rows of an Excel file (enough for a PII scan)
+        
+        Args:
+            file_path: Path to Excel file
+            file_bytes: Raw file content; if given, parsed instead of reading from disk
+            nrows: Number of data rows to read
+            
+        Returns:
+            pandas DataFrame with at most nrows rows
+        """
+        return FileHandler.load_excel(file_path, file_bytes, nrows=nrows)
+    
+    @staticmethod
+    def iter_rows(file_path: Path, file_bytes: Optional[bytes] = None) -> Iterator[List[Any]]:
+        """
+        Stream the rows of the first sheet without building a DataFrame
+        
+        The first row yielded is the header row. Cells are normalized the way
+        load_excel reads them: empty cells become None, whole-number floats int.
+        
+        Args:
+            file_path: Path to Excel file (suffix selects the engine)
+            file_bytes: Raw file content; if given, parsed instead of reading from disk
+            
+        Yields:
+            One list of cell values per row
+            
+        Raises:
+            ValueError: If file cannot be read
+        """
+        source = BytesIO(file_bytes) if file_bytes is not None else file_path
+        workbook = None
+        
+        try:
+            if CALAMINE_AVAILABLE:
+                if file_bytes is not None:
+                    workbook = CalamineWorkbook.from_filelike(source)
+                else:
+                    workbook = CalamineWorkbook.from_path(str(file_path))
+                rows = workbook.get_sheet_by_index(0).iter_rows()
+            elif file_path.suffix.lower() == '.xlsx':
+                workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+                rows = workbook.worksheets[0].iter_rows(values_only=True)
+            else:
+                # xlrd has no row streaming; read the sheet and replay it
+                df = FileHandler.load_excel(file_path, file_bytes)
+                rows = iter([list(df.columns)] + df.values.tolist())
+            
+            for row in rows:
+                yield [FileHandler._normalize_cell(value) for value in row]
+                
+        except Exception as e:
+            logger.error(f"Failed to read Excel rows: {e}")
+            raise ValueError(f"לא ניתן לקרוא את הקובץ: {str(e)}")
+        
+        finally:
+            # Also runs when the consumer stops early and the generator is closed
+            if workbook is not None:
+                workbook.close()
+    
+    @staticmethod
+    def _normalize_cell(value: Any) -> Any:
+        """Convert a raw reader cell to the value pandas would hold"""
+        if value == '':
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+    
     @staticmethod
     def save_excel(df: pd.DataFrame, output_path: Path) -> None:
         """
@@ -92,7 +228,7 @@ class FileHandler:
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
             # Save to Excel
-            df.to_excel(output_path, index=False, engine='openpyxl')
+            FileHandler._write_excel(df, output_path)
             
             logger.success(f"Successfully saved to {output_path}")
             
@@ -100,6 +236,90 @@ class FileHandler:
             logger.error(f"Failed to save Excel file: {e}")
             raise ValueError(f"לא ניתן לשמור את הקובץ: {str(e)}")
     
+    @staticmethod
+    def save_excel_to_bytes(df: pd.DataFrame) -> bytes:
+        """
+        Serialize DataFrame to Excel in memory (no temp file on disk)
+        
+        Args:
+            df: pandas DataFrame
+            
+        Returns:
+            Excel file content as bytes
+            
+        Raises:
+            ValueError: If file cannot be created
+        """
+        try:
+            buffer = BytesIO()
+            FileHandler._write_excel(df, buffer)
+            
+            logger.success(f"Serialized {len(df)} rows to Excel in memory")
+            return buffer.getvalue()
+            
+        except Exception as e:
+            logger.error(f"Failed to create Excel file: {e}")
+            raise ValueError(f"לא ניתן לשמור את הקובץ: {str(e)}")
+    
+    @staticmethod
+    def _write_excel(df: pd.DataFrame, target) -> None:
+        """
+        Write DataFrame to an .xlsx path or buffer row by row with xlsxwriter
+        (skips pandas' to_excel formatter, which builds one cell object per value)
+        
+        Args:
+            df: pandas DataFrame
+            target: Output path or binary buffer
+        """
+        with pd.ExcelWriter(
+            target,
+            engine='xlsxwriter',
+            engine_kwargs={'options': FileHandler.WRITER_OPTIONS}
+        ) as writer:
+            FileHandler.write_sheet(writer.book, 'Sheet1', df)
+    
+    @staticmethod
+    def write_sheet(workbook, sheet_name: str, df: pd.DataFrame) -> None:
+        """
+        Add one sheet to an xlsxwriter workbook and write the DataFrame row by row
+        
+        Shared by _write_excel and the multi-sheet export in app_simple.py; open
+        the workbook with WRITER_OPTIONS.
+        
+        Args:
+            workbook: xlsxwriter Workbook (e.g. ExcelWriter.book)
+            sheet_name: Name of the new sheet
+            df: pandas DataFrame
+        """
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, list(df.columns), workbook.add_format({'bold': True, 'border': 1}))
+        
+        columns = [FileHandler._excel_values(series) for _, series in df.items()]
+        for row_idx, row in enumerate(zip(*columns), start=1):
+            worksheet.write_row(row_idx, 0, row)
+    
+    @staticmethod
+    def _excel_values(series: pd.Series) -> list:
+        """
+        Column values for write_row, converted the way to_excel writes them
+        
+        Args:
+            series: One DataFrame column
+            
+        Returns:
+            List of cell values: missing -> None (empty cell),
+            +/-inf -> 'inf' / '-inf' text (xlsxwriter can't write inf as a number)
+        """
+        values = series.astype(object).where(series.notna(), None) if series.hasnans else series
+        
+        if series.dtype.kind in 'fO':
+            is_inf = series.isin([np.inf, -np.inf]).to_numpy()
+            if is_inf.any():
+                values = values.astype(object)
+                values[is_inf] = np.where(series[is_inf] > 0, 'inf', '-inf')
+        
+        return values.tolist()
+    
     @staticmethod
     def secure_delete(file_path: Path) -> None:
         """
@@ -110,9 +330,21 @@ class FileHandler:
         """
         try:
             if file_path.exists():
-                # Overwrite with zeros (simple version)
-                with open(file_path, 'wb') as f:
-                    f.write(b'\x00' * file_path.stat().st_size)
+                # Overwrite the existing bytes in place with zeros, reusing one
+                # chunk-sized buffer ('wb' would truncate and free the old blocks)
+                remaining = file_path.stat().st_size
+                zeros = memoryview(bytes(min(remaining, FileHandler.WIPE_CHUNK_SIZE)))
+                
+                with open(file_path, 'r+b') as f:
+                    while remaining > 0:
+                        remaining -= f.write(zeros[:remaining])
+                    
+                    f.flush()
+                    os.fsync(f.fileno())
+                    
+                    # Drop the file's pages from the OS cache (POSIX only)
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
                 
                 # Delete
                 file_path.unlink()
@@ -133,10 +365,22 @@ def get_file_info(df: pd.DataFrame) -> dict:
     Returns:
         Dictionary with file statistics
     """
+    # A deep measure walks every object in text columns, so on large sheets
+    # measure a fixed sample of rows and scale it up (index measured as is)
+    sample_size = min(1000, len(df))
+    if sample_size < len(df):
+        sample = df.sample(sample_size, random_state=0)
+        memory_bytes = (
+            sample.memory_usage(index=False, deep=True).sum() * len(df) / sample_size
+            + df.index.memory_usage()
+        )
+    else:
+        memory_bytes = df.memory_usage(deep=True).sum()
+    
     return {
         'rows': len(df),
         'columns': len(df.columns),
         'column_names': df.columns.tolist(),
         'dtypes': df.dtypes.to_dict(),
-        'memory_usage_mb': df.memory_usage(deep=True).sum() / (1024 * 1024)
+        'memory_usage_mb': memory_bytes / (1024 * 1024)
     }
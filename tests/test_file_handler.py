@@ -0,0 +1,76 @@
+"""
+Tests for FileHandler Excel export
+"""
+
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from src.file_handler import FileHandler
+
+
+def to_excel_bytes(df):
+    """Reference output: pandas' own to_excel"""
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def raw_columns(content):
+    """Cell values of the first sheet as stored in the file, keyed by header"""
+    worksheet = openpyxl.load_workbook(BytesIO(content)).worksheets[0]
+    header, *rows = worksheet.iter_rows(values_only=True)
+    return dict(zip(header, map(list, zip(*rows))))
+
+
+@pytest.fixture
+def special_values_df():
+    # +/-inf can't be written by xlsxwriter's write_number; NaN / NA must become empty cells
+    return pd.DataFrame({
+        'float': [1.5, np.inf, -np.inf, np.nan],
+        'int64': pd.array([1, None, 3, 4], dtype='Int64'),
+        'float64': pd.array([0.5, None, 2.0, -1.0], dtype='Float64'),
+        'text': ['a', None, 'inf', 'x'],
+        'mixed': pd.Series([np.inf, 't', None, 2], dtype=object),
+    })
+
+
+def test_excel_round_trip_matches_to_excel(special_values_df):
+    result = pd.read_excel(BytesIO(FileHandler.save_excel_to_bytes(special_values_df)))
+    expected = pd.read_excel(BytesIO(to_excel_bytes(special_values_df)))
+    
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_excel_writes_inf_as_text_and_missing_as_empty(special_values_df):
+    cells = raw_columns(FileHandler.save_excel_to_bytes(special_values_df))
+    
+    assert cells['float'] == [1.5, 'inf', '-inf', None]
+    assert cells['int64'] == [1, None, 3, 4]
+    assert cells['float64'] == [0.5, None, 2, -1]
+    assert cells['mixed'] == ['inf', 't', None, 2]
+    assert cells == raw_columns(to_excel_bytes(special_values_df))
+
+
+def test_excel_round_trip_of_csv_parsed_inf():
+    # read_csv turns the text 'inf' into a float
+    df = pd.read_csv(BytesIO(b'id,value\n1,inf\n2,-inf\n3,\n'))
+    
+    cells = raw_columns(FileHandler.save_excel_to_bytes(df))
+    
+    assert cells['value'] == ['inf', '-inf', None]
+
+
+def test_write_sheet_adds_sheets_to_one_workbook(special_values_df):
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter', engine_kwargs={'options': FileHandler.WRITER_OPTIONS}) as writer:
+        FileHandler.write_sheet(writer.book, 'First', special_values_df)
+        FileHandler.write_sheet(writer.book, 'Second', special_values_df.head(2))
+    
+    sheets = pd.read_excel(BytesIO(buffer.getvalue()), sheet_name=None)
+    
+    assert list(sheets) == ['First', 'Second']
+    assert len(sheets['Second']) == 2
@@ -0,0 +1,74 @@
+"""
+Tests for PIIDetector column scans
+"""
+
+import pandas as pd
+import pytest
+
+from src.pii_detector import PII_PATTERNS, PIIDetector
+
+
+@pytest.fixture
+def detector():
+    return PIIDetector()
+
+
+def expected_counts(detector, values):
+    """Count values per PII type with each pattern's own findall (IDs must pass Luhn)"""
+    counts = dict.fromkeys(PII_PATTERNS, 0)
+    
+    for value in values:
+        text = str(value)
+        for pii_type, pattern in PII_PATTERNS.items():
+            matches = pattern.findall(text)
+            if pii_type == 'israeli_id':
+                matches = [m for m in matches if detector._validate_israeli_id(m)]
+            if matches:
+                counts[pii_type] += 1
+    
+    return counts
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('031234567', {'israeli_id': 0, 'email': 0, 'phone': 1}),            # phone, fails Luhn
+    ('000000018', {'israeli_id': 1, 'email': 0, 'phone': 1}),            # valid ID + phone
+    ('0521234567@walla.co.il', {'israeli_id': 0, 'email': 1, 'phone': 1}),
+    ('123456782@walla.co.il', {'israeli_id': 1, 'email': 1, 'phone': 0}),
+    ('a.123456782@x.com', {'israeli_id': 1, 'email': 1, 'phone': 0}),     # ID inside the email
+    ('050-1234567, user@example.com', {'israeli_id': 0, 'email': 1, 'phone': 1}),
+    ('٠٠٠٠٠٠٠١٨', {'israeli_id': 1, 'email': 0, 'phone': 0}),            # non-ASCII digits
+    ('hello world', {'israeli_id': 0, 'email': 0, 'phone': 0}),
+])
+def test_overlapping_pii_counts_each_type(detector, value, expected):
+    counts = detector.detect_in_column(pd.Series([value]))
+    
+    assert counts == expected
+    assert counts == expected_counts(detector, [value])
+
+
+def test_combined_scan_matches_per_pattern_findall(detector):
+    values = [
+        '123456782', '123456789', '031234567', '0521234567', '052-1234567',
+        'user@example.com', '0521234567@walla.co.il', '123456782@walla.co.il',
+        'ids 123456782 and 000000018', 'tel 03-1234567 / 054-7654321',
+        'x.052-1234567@mail.org', '1234567890', 'plain text', '', 42, 123456782,
+    ]
+    series = pd.Series(values * 3 + [None])
+    
+    assert detector.detect_in_column(series) == expected_counts(detector, values * 3)
+
+
+def test_scan_dataframe_matches_detect_in_column(detector):
+    df = pd.DataFrame({
+        'mixed': ['0521234567@walla.co.il', '031234567', '123456782', None],
+        'text': ['a', 'b', 'c', 'd'],
+    })
+    
+    results = detector.scan_dataframe(df)
+    
+    assert list(results) == ['mixed']
+    assert results['mixed']['counts'] == {
+        pii_type: count
+        for pii_type, count in detector.detect_in_column(df['mixed']).items()
+        if count
+    }